@@ -6,6 +6,7 @@ Import and use these functions in your API endpoints for database operations.
 """
 
 from pymongo import MongoClient
+import redis
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
@@ -21,10 +22,31 @@ db = None
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
+# Pool limits are per process; gunicorn runs one pool per worker (see gunicorn_conf.py)
+mongo_max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", 25))
+mongo_min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", 2))
+
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = MongoClient(
+        database_url,
+        maxPoolSize=mongo_max_pool_size,
+        minPoolSize=mongo_min_pool_size,
+        maxIdleTimeMS=300000,
+        serverSelectionTimeoutMS=2000,
+    )
     db = _client[database_name]
 
+# Optional Redis response cache; endpoints fall through to MongoDB without it.
+# Configure the server with `maxmemory-policy allkeys-lfu` so hot keys stay resident.
+cache = None
+
+redis_url = os.getenv("REDIS_URL")
+
+if redis_url:
+    # Short socket timeouts so an unreachable host degrades to a miss instead of
+    # blocking a worker thread for the OS TCP timeout
+    cache = redis.Redis.from_url(redis_url, socket_timeout=0.1, socket_connect_timeout=0.1)
+
 # Helper functions for common database operations
 def create_document(collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
@@ -53,3 +75,35 @@ def get_documents(collection_name: str, filter_dict: dict = None, limit: int = N
         cursor = cursor.limit(limit)
     
     return list(cursor)
+
+# Cache helpers: failures are swallowed so a Redis outage only costs a cache miss
+def cache_get(key: str):
+    """Return cached bytes for key, or None on miss"""
+    if cache is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception:
+        return None
+
+def cache_set(key: str, value: bytes, ttl: int = 30):
+    """Store bytes under key with a TTL in seconds.
+
+    Readers fill the cache after their own DB read, so one that raced an admin
+    write can store a stale blob after the invalidation; the short TTL bounds that.
+    """
+    if cache is None:
+        return
+    try:
+        cache.setex(key, ttl, value)
+    except Exception:
+        pass
+
+def cache_delete(*keys: str):
+    """Invalidate one or more cache keys"""
+    if cache is None:
+        return
+    try:
+        cache.delete(*keys)
+    except Exception:
+        pass
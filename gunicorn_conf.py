@@ -0,0 +1,21 @@
+"""
+Gunicorn Configuration
+
+Runs the FastAPI app under Uvicorn workers (uvloop is picked up automatically
+when installed). Usage: gunicorn main:app -c gunicorn_conf.py
+
+Every worker opens its own MongoDB pool, so cluster-wide connections are
+workers * MONGO_MAX_POOL_SIZE (max) and workers * MONGO_MIN_POOL_SIZE (idle).
+With the defaults on 8 cores: 17 workers -> 425 max / 34 idle connections.
+Lower WEB_CONCURRENCY or the pool size if that exceeds the cluster's
+connection limit.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * (os.cpu_count() or 1) + 1))
+keepalive = 5
+timeout = 60
+graceful_timeout = 30
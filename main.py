@@ -1,13 +1,29 @@
 import os
+import re
+import hmac
+import time
+import threading
+from datetime import datetime, timezone
 from typing import List, Optional
 from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, Field, EmailStr
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+import orjson
+import anyio
 
-from database import db, create_document, get_documents
+from database import db, create_document, get_documents, cache_get, cache_set, cache_delete
 
-app = FastAPI(title="Forest Health Goods API")
+# Handlers stay sync because the PyMongo and Redis helpers are blocking; they run
+# on AnyIO's worker threads (40 by default). Sized independently of the Mongo pool:
+# cache hits and DB-down fallbacks need a thread but no connection, and DB-bound
+# threads beyond the pool just wait for a free connection.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 100))
+
+app = FastAPI(title="Forest Health Goods API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +39,10 @@ ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "F0r3St12!")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "F0r3St12!")
 ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "forest-admin-token-001")
 
+def secrets_match(provided: str, expected: str) -> bool:
+    """Constant-time comparison (bytes, so non-ASCII input can't raise)"""
+    return hmac.compare_digest(provided.encode(), expected.encode())
+
 class LoginRequest(BaseModel):
     username: str
     password: str
@@ -32,7 +52,10 @@ class LoginResponse(BaseModel):
 
 @app.post("/api/login", response_model=LoginResponse)
 def admin_login(payload: LoginRequest):
-    if payload.username == ADMIN_USERNAME and payload.password == ADMIN_PASSWORD:
+    # Evaluate both so timing doesn't reveal which field was wrong
+    username_ok = secrets_match(payload.username, ADMIN_USERNAME)
+    password_ok = secrets_match(payload.password, ADMIN_PASSWORD)
+    if username_ok and password_ok:
         return {"token": ADMIN_TOKEN}
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -41,11 +64,33 @@ def require_admin(authorization: Optional[str] = Header(None)):
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing token")
     token = authorization.split(" ", 1)[1]
-    if token != ADMIN_TOKEN:
+    if not secrets_match(token, ADMIN_TOKEN):
         raise HTTPException(status_code=403, detail="Invalid token")
     return True
 
 
+# ---------------------- IDS ----------------------
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+
+def parse_object_id(value: str, label: str) -> ObjectId:
+    """Gate on a compiled regex so bad ids never reach bson's exception path"""
+    if not _OID_RE.fullmatch(value):
+        raise HTTPException(status_code=400, detail=f"Invalid {label} id")
+    return ObjectId(value)
+
+
+# ---------------------- CACHE ----------------------
+PRODUCTS_CACHE_KEY = "products:v1"
+CATEGORIES_CACHE_KEY = "categories:v1"
+CONTENT_CACHE_KEY = "content:v1"
+
+
+def json_bytes_response(blob: bytes) -> Response:
+    """Return already-serialized JSON without re-encoding (Content-Length comes from len(blob))"""
+    return Response(content=blob, media_type="application/json")
+
+
 # ---------------------- MODELS ----------------------
 class CartItem(BaseModel):
     product_id: str = Field(..., description="Product ID")
@@ -78,6 +123,9 @@ class ProductIn(BaseModel):
 class ProductOut(ProductIn):
     id: str
 
+# Fields returned by the public product listing
+PRODUCT_PROJECTION = {field: 1 for field in ProductIn.model_fields}
+
 class CategoryIn(BaseModel):
     name: str
     slug: str
@@ -111,6 +159,25 @@ def hello():
     return {"message": "Hello from the backend API!"}
 
 
+# Resolved once; the process environment doesn't change while serving
+_HAS_DB_URL = bool(os.getenv("DATABASE_URL"))
+_HAS_DB_NAME = bool(os.getenv("DATABASE_NAME"))
+
+# listCollections is an admin command; reuse the result for a short window
+COLLECTIONS_CACHE_TTL = 10
+_collections_cache = {"at": 0.0, "data": []}
+
+
+def cached_collection_names():
+    now = time.monotonic()
+    if _collections_cache["at"] and now - _collections_cache["at"] < COLLECTIONS_CACHE_TTL:
+        return _collections_cache["data"]
+    data = db.list_collection_names()
+    _collections_cache["data"] = data
+    _collections_cache["at"] = now
+    return data
+
+
 @app.get("/test")
 def test_database():
     """Test endpoint to check if database is available and accessible"""
@@ -130,7 +197,7 @@ def test_database():
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = cached_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -141,9 +208,8 @@ def test_database():
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:50]}"
 
-    import os as _os
-    response["database_url"] = "✅ Set" if _os.getenv("DATABASE_URL") else "❌ Not Set"
-    response["database_name"] = "✅ Set" if _os.getenv("DATABASE_NAME") else "❌ Not Set"
+    response["database_url"] = "✅ Set" if _HAS_DB_URL else "❌ Not Set"
+    response["database_name"] = "✅ Set" if _HAS_DB_NAME else "❌ Not Set"
 
     return response
 
@@ -188,6 +254,31 @@ SAMPLE_PRODUCTS = [
     },
 ]
 
+# Minimal content served when the database is not configured
+FALLBACK_CONTENT = {
+    "hero_title": "Wellness from the Forest",
+    "hero_subtitle": "Pure, eco-friendly goods crafted with care.",
+    "hero_cta_text": "Order Online",
+    "hero_secondary_cta_text": "Our Promise",
+    "hero_badges": ["• Certified organic", "• Plastic-free shipping", "• 30-day happiness guarantee"],
+    "hero_image": None,
+    "spline_url": None,
+    "shop_title": "Shop popular picks",
+    "shop_subtitle": "Nature-made • Lab-tested • Planet-kind",
+    "trust_items": [],
+    "testimonials": [],
+}
+
+# Fixed _ids make seeding idempotent: every gunicorn worker runs startup, and
+# concurrent upserts on the same _id can't produce duplicate documents
+SEED_PRODUCT_IDS = [ObjectId(f"{i + 1:024x}") for i in range(len(SAMPLE_PRODUCTS))]
+SEED_CONTENT_ID = ObjectId(f"{1:024x}")
+
+# The DB-down fallbacks never change, so serialize them once at import
+_SAMPLE_PRODUCTS_BYTES = orjson.dumps(SAMPLE_PRODUCTS)
+_FALLBACK_CONTENT_BYTES = orjson.dumps(FALLBACK_CONTENT)
+_EMPTY_LIST_BYTES = orjson.dumps([])
+
 
 def seed_products_if_needed():
     try:
@@ -195,8 +286,22 @@ def seed_products_if_needed():
             return
         count = db["product"].count_documents({})
         if count == 0:
-            for p in SAMPLE_PRODUCTS:
-                create_document("product", p)
+            # One batched round-trip of upserts
+            now = datetime.now(timezone.utc)
+            try:
+                res = db["product"].bulk_write(
+                    [
+                        UpdateOne({"_id": oid}, {"$setOnInsert": {**p, "created_at": now, "updated_at": now}}, upsert=True)
+                        for oid, p in zip(SEED_PRODUCT_IDS, SAMPLE_PRODUCTS)
+                    ],
+                    ordered=False,
+                )
+                upserted = res.upserted_count
+            except BulkWriteError as e:
+                # Another worker won the race on some _ids; keep seeding content
+                upserted = e.details.get("nUpserted", 0)
+            if upserted:
+                cache_delete(PRODUCTS_CACHE_KEY)
         # Seed default content document if none exists
         content_count = db["content"].count_documents({})
         if content_count == 0:
@@ -226,14 +331,42 @@ def seed_products_if_needed():
                     {"quote": "Love the soft, modern vibe and quality.", "author": "Jules K.", "role": "Nutritionist"},
                 ],
             }
-            create_document("content", default_content)
+            now = datetime.now(timezone.utc)
+            default_content["created_at"] = now
+            default_content["updated_at"] = now
+            res = db["content"].update_one({"_id": SEED_CONTENT_ID}, {"$setOnInsert": default_content}, upsert=True)
+            if res.upserted_id is not None:
+                cache_delete(CONTENT_CACHE_KEY)
     except Exception:
         pass
 
 
+def ensure_indexes():
+    """Declare every collection index in one place; create_index is a no-op if it exists"""
+    if db is None:
+        return
+    for collection, keys, options in [
+        ("product", "category", {}),
+        ("category", "slug", {"unique": True}),
+        ("order", [("status", 1), ("_id", -1)], {}),
+    ]:
+        try:
+            db[collection].create_index(keys, **options)
+        except Exception:
+            pass
+
+
 @app.on_event("startup")
 async def on_startup():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # Warm the connection pool so the first requests don't pay the handshake
+    if db is not None:
+        try:
+            db.command("ping")
+        except Exception:
+            pass
     seed_products_if_needed()
+    ensure_indexes()
 
 
 # ---------------------- PRODUCTS ----------------------
@@ -241,16 +374,18 @@ async def on_startup():
 def list_products():
     if db is None:
         # fallback to sample
-        return SAMPLE_PRODUCTS
-    products = get_documents("product")
-    # Convert ObjectId to string if present
-    normalized = []
-    for p in products:
-        if isinstance(p.get("_id"), ObjectId):
-            p["id"] = str(p["_id"])
-            del p["_id"]
-        normalized.append(p)
-    return normalized
+        return json_bytes_response(_SAMPLE_PRODUCTS_BYTES)
+    cached = cache_get(PRODUCTS_CACHE_KEY)
+    if cached is not None:
+        return json_bytes_response(cached)
+    # Normalize _id -> id in one pass straight off the cursor
+    normalized = [
+        {**{k: v for k, v in p.items() if k != "_id"}, "id": str(p["_id"])}
+        for p in db["product"].find({}, PRODUCT_PROJECTION)
+    ]
+    blob = orjson.dumps(normalized)
+    cache_set(PRODUCTS_CACHE_KEY, blob)
+    return json_bytes_response(blob)
 
 
 @app.post("/api/products", dependencies=[Depends(require_admin)])
@@ -258,6 +393,7 @@ def create_product(payload: ProductIn):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
     pid = create_document("product", payload.model_dump())
+    cache_delete(PRODUCTS_CACHE_KEY)
     doc = db["product"].find_one({"_id": ObjectId(pid)})
     doc["id"] = str(doc.pop("_id"))
     return doc
@@ -267,14 +403,13 @@ def create_product(payload: ProductIn):
 def update_product(product_id: str, payload: ProductIn):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    try:
-        oid = ObjectId(product_id)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid product id")
-    db["product"].update_one({"_id": oid}, {"$set": payload.model_dump()})
-    doc = db["product"].find_one({"_id": oid})
+    oid = parse_object_id(product_id, "product")
+    doc = db["product"].find_one_and_update(
+        {"_id": oid}, {"$set": payload.model_dump()}, return_document=ReturnDocument.AFTER
+    )
     if not doc:
         raise HTTPException(status_code=404, detail="Product not found")
+    cache_delete(PRODUCTS_CACHE_KEY)
     doc["id"] = str(doc.pop("_id"))
     return doc
 
@@ -283,11 +418,9 @@ def update_product(product_id: str, payload: ProductIn):
 def delete_product(product_id: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    try:
-        oid = ObjectId(product_id)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid product id")
+    oid = parse_object_id(product_id, "product")
     res = db["product"].delete_one({"_id": oid})
+    cache_delete(PRODUCTS_CACHE_KEY)
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"ok": True}
@@ -297,14 +430,19 @@ def delete_product(product_id: str):
 @app.get("/api/categories")
 def list_categories():
     if db is None:
-        return []
+        return json_bytes_response(_EMPTY_LIST_BYTES)
+    cached = cache_get(CATEGORIES_CACHE_KEY)
+    if cached is not None:
+        return json_bytes_response(cached)
     cats = get_documents("category")
     out = []
     for c in cats:
         if isinstance(c.get("_id"), ObjectId):
             c["id"] = str(c.pop("_id"))
         out.append(c)
-    return out
+    blob = orjson.dumps(out)
+    cache_set(CATEGORIES_CACHE_KEY, blob)
+    return json_bytes_response(blob)
 
 
 @app.post("/api/categories", dependencies=[Depends(require_admin)])
@@ -312,6 +450,7 @@ def create_category(payload: CategoryIn):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
     cid = create_document("category", payload.model_dump())
+    cache_delete(CATEGORIES_CACHE_KEY)
     doc = db["category"].find_one({"_id": ObjectId(cid)})
     doc["id"] = str(doc.pop("_id"))
     return doc
@@ -321,14 +460,13 @@ def create_category(payload: CategoryIn):
 def update_category(category_id: str, payload: CategoryIn):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    try:
-        oid = ObjectId(category_id)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid category id")
-    db["category"].update_one({"_id": oid}, {"$set": payload.model_dump()})
-    doc = db["category"].find_one({"_id": oid})
+    oid = parse_object_id(category_id, "category")
+    doc = db["category"].find_one_and_update(
+        {"_id": oid}, {"$set": payload.model_dump()}, return_document=ReturnDocument.AFTER
+    )
     if not doc:
         raise HTTPException(status_code=404, detail="Category not found")
+    cache_delete(CATEGORIES_CACHE_KEY)
     doc["id"] = str(doc.pop("_id"))
     return doc
 
@@ -337,95 +475,110 @@ def update_category(category_id: str, payload: CategoryIn):
 def delete_category(category_id: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    try:
-        oid = ObjectId(category_id)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid category id")
+    oid = parse_object_id(category_id, "category")
     res = db["category"].delete_one({"_id": oid})
+    cache_delete(CATEGORIES_CACHE_KEY)
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
     return {"ok": True}
 
 
 # ---------------------- CONTENT ----------------------
+# Per-worker copy of the content blob, checked before Redis. Edits in this worker
+# replace it immediately and bump the version; reads that started before the edit
+# then skip both the local and the Redis fill. Other workers pick the change up
+# once the short TTL lapses.
+CONTENT_LOCAL_TTL = 5
+_content_cache = {"version": 0, "at": 0.0, "blob": None}
+# Handlers run on threadpool threads; version bumps and check-and-store must be atomic
+_content_lock = threading.Lock()
+
+
+def store_local_content(blob: bytes, version: int):
+    with _content_lock:
+        if _content_cache["version"] != version:
+            return
+        _content_cache["blob"] = blob
+        _content_cache["at"] = time.monotonic()
+
+
 @app.get("/api/content")
 def get_content():
     """Fetch the single editable site content document"""
     if db is None:
         # Fallback minimal content
-        return {
-            "hero_title": "Wellness from the Forest",
-            "hero_subtitle": "Pure, eco-friendly goods crafted with care.",
-            "hero_cta_text": "Order Online",
-            "hero_secondary_cta_text": "Our Promise",
-            "hero_badges": ["• Certified organic", "• Plastic-free shipping", "• 30-day happiness guarantee"],
-            "hero_image": None,
-            "spline_url": None,
-            "shop_title": "Shop popular picks",
-            "shop_subtitle": "Nature-made • Lab-tested • Planet-kind",
-            "trust_items": [],
-            "testimonials": [],
-        }
+        return json_bytes_response(_FALLBACK_CONTENT_BYTES)
+    blob = _content_cache["blob"]
+    if blob is not None and time.monotonic() - _content_cache["at"] < CONTENT_LOCAL_TTL:
+        return json_bytes_response(blob)
+    version = _content_cache["version"]
+    cached = cache_get(CONTENT_CACHE_KEY)
+    if cached is not None:
+        store_local_content(cached, version)
+        return json_bytes_response(cached)
     doc = db["content"].find_one({})
     if not doc:
         raise HTTPException(status_code=404, detail="Content not found")
     doc["id"] = str(doc.pop("_id"))
-    return doc
+    blob = orjson.dumps(doc)
+    if _content_cache["version"] == version:
+        cache_set(CONTENT_CACHE_KEY, blob)
+        store_local_content(blob, version)
+    return json_bytes_response(blob)
 
 
 @app.put("/api/content", dependencies=[Depends(require_admin)])
 def update_content(payload: UpdateContentRequest):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    doc = db["content"].find_one({})
+    updates = payload.model_dump(exclude_none=True)
+    doc = db["content"].find_one_and_update({}, {"$set": updates}, return_document=ReturnDocument.AFTER)
     if not doc:
         raise HTTPException(status_code=404, detail="Content not found")
-    updates = {k: v for k, v in payload.model_dump(exclude_none=True).items()}
-    db["content"].update_one({"_id": doc["_id"]}, {"$set": updates})
-    new_doc = db["content"].find_one({"_id": doc["_id"]})
-    new_doc["id"] = str(new_doc.pop("_id"))
-    return new_doc
+    doc["id"] = str(doc.pop("_id"))
+    with _content_lock:
+        version = _content_cache["version"] = _content_cache["version"] + 1
+    blob = orjson.dumps(doc)
+    # Write through so Redis holds the new blob rather than an empty slot a racing reader could refill
+    cache_set(CONTENT_CACHE_KEY, blob)
+    store_local_content(blob, version)
+    return json_bytes_response(blob)
 
 
 # ---------------------- CHECKOUT ----------------------
+def cart_pricing_pipeline(ids: List[ObjectId]) -> List[dict]:
+    """Fetch only what pricing needs for the cart's products in one round-trip"""
+    return [
+        {"$match": {"_id": {"$in": ids}}},
+        {"$project": {"title": 1, "price": {"$toDouble": {"$ifNull": ["$price", 0]}}}},
+    ]
+
+
 @app.post("/api/checkout")
 def create_order(payload: CreateOrderRequest):
     if not payload.items:
         raise HTTPException(status_code=400, detail="No items in order")
 
-    # Resolve product pricing
-    items_summary = []
-    subtotal = 0.0
-
-    # Fetch products by ids
-    ids = []
-    for it in payload.items:
-        try:
-            ids.append(ObjectId(it.product_id))
-        except Exception:
-            # if not a valid ObjectId, skip DB lookup and rely on FE data (fallback)
-            pass
+    # Resolve product pricing; malformed ids are left out and fail the lookup below
+    ids = [ObjectId(it.product_id) for it in payload.items if _OID_RE.fullmatch(it.product_id)]
 
     product_map = {}
     if db is not None and ids:
-        for doc in db["product"].find({"_id": {"$in": ids}}):
+        for doc in db["product"].aggregate(cart_pricing_pipeline(ids), hint="_id_"):
             product_map[str(doc["_id"])] = doc
 
+    items_summary = []
+    subtotal = 0.0
     for it in payload.items:
-        prod = product_map.get(it.product_id)
-        if prod is None:
-            # try to find by id directly
-            try:
-                prod = db["product"].find_one({"_id": ObjectId(it.product_id)}) if db is not None else None
-            except Exception:
-                prod = None
+        # str(ObjectId) is lowercase hex
+        prod = product_map.get(it.product_id.lower())
         if prod is None:
             raise HTTPException(status_code=400, detail=f"Product not found: {it.product_id}")
-        price = float(prod.get("price", 0))
+        price = prod["price"]
         line_total = price * it.quantity
         subtotal += line_total
         items_summary.append({
-            "product_id": str(prod.get("_id", it.product_id)),
+            "product_id": str(prod["_id"]),
             "title": prod.get("title"),
             "price": price,
             "quantity": it.quantity,
@@ -453,6 +606,7 @@ def create_order(payload: CreateOrderRequest):
 
 
 if __name__ == "__main__":
+    # Single-process dev server; production runs `gunicorn main:app -c gunicorn_conf.py`
     import uvicorn
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)